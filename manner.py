@@ -1,5 +1,5 @@
 import tkinter as tk
-from tkinter import ttk, messagebox, scrolledtext
+from tkinter import ttk, messagebox, scrolledtext, simpledialog
 import socket
 import json
 import threading
@@ -8,7 +8,1272 @@ import time
 import subprocess
 import webbrowser
 import os
+import errno
+import math
+import multiprocessing
+import multiprocessing.connection
+import zlib
+import queue
+import re
+import select
+import struct
+import tempfile
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from urllib3.exceptions import NewConnectionError
+
+# Modbus RTU CRC16 查找表 (多项式 0xA001)
+_CRC16_TABLE = []
+for _i in range(256):
+    _crc = _i
+    for _ in range(8):
+        _crc = (_crc >> 1) ^ 0xA001 if _crc & 1 else _crc >> 1
+    _CRC16_TABLE.append(_crc)
+_CRC16_TABLE = tuple(_CRC16_TABLE)
+
+
+def modbus_crc16(data, start=0, end=None):
+    """计算Modbus RTU CRC16，可指定区间以避免切片复制"""
+    if end is None:
+        end = len(data)
+    crc = 0xFFFF
+    table = _CRC16_TABLE
+    for i in range(start, end):
+        crc = (crc >> 8) ^ table[(crc ^ data[i]) & 0xFF]
+    return crc
+
+
+# 解码后的帧：协议名、时间戳、负载字节
+Frame = namedtuple("Frame", ["protocol", "timestamp", "payload"])
+
+
+class FrameDecoder:
+    """帧解码器基类，增量解析字节流，不重复扫描已检查过的数据"""
+    protocol = "raw"
+
+    def __init__(self, max_length=4096):
+        self.buffer = bytearray()
+        self.max_length = max_length
+        self.dropped = 0  # 因无法同步而丢弃的字节数
+
+    def feed(self, data, timestamp=None):
+        """送入新数据，逐个产出完整的帧"""
+        self.buffer += data
+        if timestamp is None:
+            timestamp = time.time()
+        return self.decode(timestamp)
+
+    def decode(self, timestamp):
+        raise NotImplementedError
+
+    def reset(self):
+        """清空内部缓冲区"""
+        del self.buffer[:]
+
+    def _discard(self, count):
+        """丢弃缓冲区头部已处理的数据"""
+        if count:
+            del self.buffer[:count]
+
+
+class LineDecoder(FrameDecoder):
+    """按分隔符(默认换行)切分的文本行解码器"""
+    protocol = "line"
+
+    def __init__(self, delimiter=b"\n", max_length=4096):
+        super().__init__(max_length)
+        self.delimiter = delimiter
+        self._scan = 0  # 下次查找分隔符的起始位置
+
+    def decode(self, timestamp):
+        buf = self.buffer
+        delimiter = self.delimiter
+        start = 0
+        while True:
+            end = buf.find(delimiter, self._scan)
+            if end < 0:
+                break
+            stop = end
+            if stop > start and buf[stop - 1] == 0x0D:
+                stop -= 1
+            yield Frame(self.protocol, timestamp, bytes(buf[start:stop]))
+            start = end + len(delimiter)
+            self._scan = start
+
+        self._discard(start)
+        # 超长行直接截断输出，避免缓冲区无限增长
+        if len(buf) > self.max_length:
+            yield Frame(self.protocol, timestamp, bytes(buf))
+            del buf[:]
+        self._scan = max(0, len(buf) - len(delimiter) + 1)
+
+    def reset(self):
+        super().reset()
+        self._scan = 0
+
+
+class SlipDecoder(FrameDecoder):
+    """SLIP (RFC 1055) 帧解码器"""
+    protocol = "slip"
+
+    END = 0xC0
+    ESC = 0xDB
+
+    def __init__(self, max_length=4096):
+        super().__init__(max_length)
+        self._scan = 0
+
+    def decode(self, timestamp):
+        buf = self.buffer
+        start = 0
+        while True:
+            end = buf.find(self.END, self._scan)
+            if end < 0:
+                break
+            if end > start:
+                payload = bytes(buf[start:end])
+                if self.ESC in payload:
+                    payload = payload.replace(b"\xdb\xdc", b"\xc0").replace(b"\xdb\xdd", b"\xdb")
+                yield Frame(self.protocol, timestamp, payload)
+            start = end + 1
+            self._scan = start
+
+        self._discard(start)
+        if len(buf) > self.max_length:
+            self.dropped += len(buf)
+            del buf[:]
+        self._scan = len(buf)
+
+    def reset(self):
+        super().reset()
+        self._scan = 0
+
+
+class LengthPrefixedDecoder(FrameDecoder):
+    """长度前缀帧解码器，头部为1/2/4字节无符号长度"""
+    protocol = "length"
+
+    _FORMATS = {1: "B", 2: "H", 4: "I"}
+
+    def __init__(self, header_size=2, byteorder="big", length_includes_header=False, max_length=4096):
+        super().__init__(max_length)
+        if header_size not in self._FORMATS:
+            raise ValueError(f"不支持的长度头大小: {header_size}")
+        self.header_size = header_size
+        self.length_includes_header = length_includes_header
+        self._header = struct.Struct((">" if byteorder == "big" else "<") + self._FORMATS[header_size])
+
+    def decode(self, timestamp):
+        buf = self.buffer
+        header_size = self.header_size
+        pos = 0
+        while len(buf) - pos >= header_size:
+            length = self._header.unpack_from(buf, pos)[0]
+            if self.length_includes_header:
+                length -= header_size
+            if length < 0 or length > self.max_length:
+                # 长度不合理，丢弃一个字节重新同步
+                pos += 1
+                self.dropped += 1
+                continue
+            end = pos + header_size + length
+            if end > len(buf):
+                break
+            yield Frame(self.protocol, timestamp, bytes(buf[pos + header_size:end]))
+            pos = end
+
+        self._discard(pos)
+
+
+class ModbusRtuDecoder(FrameDecoder):
+    """Modbus RTU 帧解码器
+
+    桥接后的TCP流中丢失了3.5字符的帧间隔，因此根据功能码推算候选帧长，
+    以CRC校验确定帧边界；全部候选失败时丢弃一个字节重新同步。
+    较短的候选帧长通过CRC时，若还有更长的候选尚未收齐则先等待，避免把长帧中
+    偶然通过CRC的片段当成一帧。噪声字节推算出的长帧可能把后面的有效帧卡住：
+    数据流静默超过 idle_gap 秒(相当于RTU的帧间隔)后，残留数据不会再有后续，
+    此时把未收齐的候选视为失败重新解析，其余丢弃。
+    支持功能码 1-8、11、15-17、20-24 及异常响应；43(MEI)和自定义功能码无法
+    推算帧长，会被当作噪声丢弃并计入 dropped。
+    """
+    protocol = "modbus"
+
+    MAX_ADU = 256
+
+    def __init__(self, idle_gap=0.2):
+        super().__init__(self.MAX_ADU)
+        self.idle_gap = idle_gap
+        self._last_data = None  # 上次收到数据的时间
+
+    def feed(self, data, timestamp=None):
+        if timestamp is None:
+            timestamp = time.time()
+        flushed = []
+        if (self.buffer and self._last_data is not None
+                and timestamp - self._last_data > self.idle_gap):
+            # 静默期之前的残留数据不会再有后续，按帧间隔结束处理
+            flushed = list(self.decode(self._last_data, final=True))
+            self.dropped += len(self.buffer)
+            del self.buffer[:]
+        if data:
+            self._last_data = timestamp
+            self.buffer += data
+        return self._chain(flushed, self.decode(timestamp))
+
+    @staticmethod
+    def _chain(flushed, frames):
+        yield from flushed
+        yield from frames
+
+    def _candidate_lengths(self, buf, pos, avail):
+        """根据功能码返回可能的帧长，None表示需要更多数据才能确定"""
+        function = buf[pos + 1]
+        if function & 0x80:
+            return (5,)
+        if function in (1, 2, 3, 4, 17):
+            # 请求固定8字节(17为4字节)，响应为 3 + 字节数 + 2
+            request = 4 if function == 17 else 8
+            return (request, 5 + buf[pos + 2] if avail >= 3 else None)
+        if function in (5, 6, 8):
+            return (8,)
+        if function in (15, 16):
+            return (8, 9 + buf[pos + 6] if avail >= 7 else None)
+        if function == 7:
+            return (4, 5)
+        if function == 11:
+            return (4, 8)
+        if function in (20, 21):
+            # 文件记录读写，请求和响应都以字节数开头
+            return (5 + buf[pos + 2] if avail >= 3 else None,)
+        if function == 22:
+            return (10,)
+        if function == 23:
+            # 请求在偏移10处为写入字节数，响应为 3 + 字节数 + 2
+            return (5 + buf[pos + 2] if avail >= 3 else None,
+                    13 + buf[pos + 10] if avail >= 11 else None)
+        if function == 24:
+            # 请求固定6字节，响应的字节数占2字节
+            return (6, 6 + (buf[pos + 2] << 8 | buf[pos + 3]) if avail >= 4 else None)
+        return ()
+
+    def decode(self, timestamp, final=False):
+        """final为True表示不会再有后续数据，尚未收齐的候选帧长视为失败"""
+        buf = self.buffer
+        pos = 0
+        while len(buf) - pos >= 4:
+            avail = len(buf) - pos
+            need_more = False
+            matched = 0
+            for length in self._candidate_lengths(buf, pos, avail):
+                if length is None or length > avail:
+                    # 尚未收齐的候选，超过最大帧长的不可能成立
+                    if not final and (length is None or length <= self.MAX_ADU):
+                        need_more = True
+                    continue
+                end = pos + length
+                if length > matched and modbus_crc16(buf, pos, end - 2) == buf[end - 2] | (buf[end - 1] << 8):
+                    matched = length
+            if need_more:
+                # 较短的候选可能只是长帧中偶然通过CRC的片段，等长帧收齐或静默后再判定
+                break
+            if matched:
+                # 负载为地址+PDU，不含CRC
+                yield Frame(self.protocol, timestamp, bytes(buf[pos:pos + matched - 2]))
+                pos += matched
+                continue
+            pos += 1
+            self.dropped += 1
+
+        self._discard(pos)
+
+
+# 可选的解码器，键为界面显示名称
+DECODERS = {
+    "Modbus RTU": ModbusRtuDecoder,
+    "文本行": LineDecoder,
+    "SLIP": SlipDecoder,
+    "长度前缀(2字节)": LengthPrefixedDecoder,
+}
+
+
+def describe_frame(frame):
+    """将帧格式化为便于阅读的文本"""
+    payload = frame.payload
+    if frame.protocol == "modbus":
+        return f"从站 {payload[0]} 功能码 {payload[1]:02X} 数据 {payload[2:].hex(' ').upper()}"
+    if frame.protocol == "line":
+        return payload.decode("utf-8", errors="replace")
+    return f"[{len(payload)}] {payload.hex(' ').upper()}"
+
+
+class DecoderPipeline:
+    """解码管道：桥接字节流 -> 解码器 -> 帧输出(界面、导出器等)"""
+
+    def __init__(self, device_id, decoder, sinks=None):
+        self.device_id = device_id
+        self.decoder = decoder
+        self.sinks = list(sinks or [])
+        self.frame_count = 0
+
+    def add_sink(self, sink):
+        """添加帧输出，sink(device_id, frame)"""
+        self.sinks.append(sink)
+
+    def feed(self, data):
+        """送入一段原始数据，返回本次解析出的帧数"""
+        count = 0
+        device_id = self.device_id
+        sinks = self.sinks
+        for frame in self.decoder.feed(data):
+            count += 1
+            for sink in sinks:
+                sink(device_id, frame)
+        self.frame_count += count
+        return count
+
+
+class FrameExporter:
+    """将解码后的帧以JSON Lines格式写入文件"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.file = open(path, "a", encoding="utf-8")
+
+    def __call__(self, device_id, frame):
+        line = json.dumps({
+            "device_id": device_id,
+            "protocol": frame.protocol,
+            "time": frame.timestamp,
+            "hex": frame.payload.hex(),
+        })
+        with self.lock:
+            if not self.file.closed:
+                self.file.write(line + "\n")
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+class BridgeStreamReader:
+    """读取设备端口23的桥接数据，送入解码管道"""
+
+    def __init__(self, ip, pipeline, port=23, on_stop=None, bufsize=4096):
+        self.ip = ip
+        self.port = port
+        self.pipeline = pipeline
+        self.on_stop = on_stop  # 读取结束回调 on_stop(error)
+        self.bufsize = bufsize
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.read_loop, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+
+    def read_loop(self):
+        """读取线程：复用同一个接收缓冲区，减少每帧的内存分配"""
+        error = None
+        buf = bytearray(self.bufsize)
+        view = memoryview(buf)
+        sock = None
+        try:
+            sock = socket.create_connection((self.ip, self.port), timeout=5)
+            sock.settimeout(1)
+            while self.running:
+                try:
+                    n = sock.recv_into(buf)
+                except socket.timeout:
+                    # 空数据让解码器按静默间隔处理残留数据
+                    self.pipeline.feed(b"")
+                    continue
+                if n == 0:
+                    error = "连接已被设备关闭"
+                    break
+                self.pipeline.feed(view[:n])
+        except Exception as e:
+            error = str(e)
+        finally:
+            if sock:
+                sock.close()
+            self.running = False
+            if self.on_stop:
+                self.on_stop(error)
+
+
+# 设备支持的串口参数
+SERIAL_BAUDRATES = ["9600", "19200", "38400", "57600", "115200"]
+SERIAL_PARITIES = ["N", "E", "O"]
+
+
+def percentile(sorted_values, q):
+    """最近秩法计算百分位数，sorted_values需已排序"""
+    if not sorted_values:
+        return None
+    index = max(0, math.ceil(q / 100 * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+class BridgeBenchmark:
+    """桥接链路延迟与吞吐测试
+
+    通过端口23发送带序号和时间戳的测试行，目标串口需将TX与RX短接(回环)，
+    回显的数据用LineDecoder解析。每个串口参数组合依次测量：
+    逐个往返的RTT，以及连续发送时的持续吞吐和丢失率。
+    """
+
+    FILLER = b"ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
+    HEADER_SIZE = 29  # "序号(8) 时间戳(19) " 加两个空格
+
+    def __init__(self, ip, probes=50, payload_size=48, bulk_seconds=3.0, timeout=2.0, progress=None):
+        if payload_size < self.HEADER_SIZE + 1:
+            raise ValueError(f"测试行长度至少为 {self.HEADER_SIZE + 1} 字节")
+        self.ip = ip
+        self.probes = probes
+        self.bulk_seconds = bulk_seconds
+        self.timeout = timeout
+        self.progress = progress  # 进度回调 progress(message)
+        filler_size = payload_size - self.HEADER_SIZE
+        self.filler = (self.FILLER * (filler_size // len(self.FILLER) + 1))[:filler_size]
+        self.line_size = payload_size + 1  # 含换行符
+        self.buf = bytearray(4096)
+        self.view = memoryview(self.buf)
+
+    def report(self, message):
+        if self.progress:
+            self.progress(message)
+
+    def pattern(self, seq):
+        """生成一行测试数据: 序号 时间戳(ns) 填充\\n"""
+        return b"%08d %019d %s\n" % (seq, time.perf_counter_ns(), self.filler)
+
+    def parse(self, payload):
+        """解析回显的测试行，数据损坏时返回None"""
+        if len(payload) != self.line_size - 1 or payload[self.HEADER_SIZE:] != self.filler:
+            return None
+        try:
+            return int(payload[0:8]), int(payload[9:28])
+        except ValueError:
+            return None
+
+    def device_status(self, device_id):
+        """读取设备API信息，并确认地址上的设备就是 device_id"""
+        response = requests.get(f"http://{self.ip}/api", timeout=5)
+        if response.status_code != 200:
+            raise RuntimeError(f"HTTP {response.status_code}")
+        api_info = response.json()
+        if api_info.get('device', {}).get('id') != device_id:
+            raise RuntimeError(f"{self.ip} 上的设备不是 {device_id}")
+        return api_info
+
+    def apply_serial(self, baudrate, parity):
+        """通过HTTP API修改设备串口参数"""
+        response = requests.post(f"http://{self.ip}/api/serial",
+                                 json={"baudrate": baudrate, "parity": parity}, timeout=5)
+        if response.status_code != 200 or not response.json().get('success', False):
+            raise RuntimeError(f"设置串口参数失败: {baudrate} {parity}")
+
+    def drain(self, sock, seconds):
+        """丢弃连接上残留的数据"""
+        sock.settimeout(seconds)
+        try:
+            while sock.recv_into(self.buf):
+                pass
+        except socket.timeout:
+            pass
+
+    def run(self, settings):
+        """依次测量每个(波特率, 校验位)组合，返回结果列表"""
+        results = []
+        sock = socket.create_connection((self.ip, 23), timeout=5)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        try:
+            for baudrate, parity in settings:
+                self.report(f"测试 {baudrate} {parity} ...")
+                self.apply_serial(baudrate, parity)
+                self.drain(sock, 0.3)
+                result = {"baudrate": baudrate, "parity": parity}
+                result.update(self.measure_latency(sock))
+                result.update(self.measure_throughput(sock))
+                results.append(result)
+                self.report(format_benchmark_result(result))
+        finally:
+            sock.close()
+        return results
+
+    def measure_latency(self, sock):
+        """逐个发送测试行，等待回显后再发送下一行"""
+        decoder = LineDecoder(max_length=self.line_size * 4)
+        rtts = []
+        errors = 0
+        for seq in range(self.probes):
+            sock.sendall(self.pattern(seq))
+            deadline = time.perf_counter() + self.timeout
+            received = False
+            while not received:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                sock.settimeout(remaining)
+                try:
+                    n = sock.recv_into(self.buf)
+                except socket.timeout:
+                    break
+                if n == 0:
+                    raise ConnectionError("连接已被设备关闭")
+                now = time.perf_counter_ns()
+                for frame in decoder.feed(self.view[:n]):
+                    parsed = self.parse(frame.payload)
+                    if parsed is None:
+                        errors += 1
+                    elif parsed[0] == seq:
+                        rtts.append((now - parsed[1]) / 1e6)
+                        received = True
+
+        rtts.sort()
+        return {
+            "rtt_p50_ms": percentile(rtts, 50),
+            "rtt_p90_ms": percentile(rtts, 90),
+            "rtt_p99_ms": percentile(rtts, 99),
+            "rtt_max_ms": rtts[-1] if rtts else None,
+            "probe_loss": 1 - len(rtts) / self.probes,
+            "probe_errors": errors,
+        }
+
+    def measure_throughput(self, sock):
+        """连续发送测试行bulk_seconds秒，统计收到的有效字节和丢失率"""
+        decoder = LineDecoder(max_length=self.line_size * 4)
+        sent = 0
+        received = set()
+        errors = 0
+        pending = b""
+        start = time.perf_counter()
+        send_until = start + self.bulk_seconds
+        last_receive = start
+        last_send = start
+        sock.setblocking(False)
+        try:
+            while True:
+                now = time.perf_counter()
+                # 到时后不再产生新行，但已发出一半的行要发完，否则设备收到的是残缺行
+                sending = now < send_until or bool(pending)
+                # 停止发送后等待剩余回显，超时无数据收发则结束
+                if now >= send_until and now - max(last_receive, last_send, send_until) > self.timeout:
+                    break
+                readable, writable, _ = select.select([sock], [sock] if sending else [], [], 0.05)
+                if writable:
+                    if not pending:
+                        pending = self.pattern(sent)
+                        sent += 1
+                    try:
+                        pending = pending[sock.send(pending):]
+                        last_send = time.perf_counter()
+                    except BlockingIOError:
+                        pass
+                if readable:
+                    try:
+                        n = sock.recv_into(self.buf)
+                    except BlockingIOError:
+                        continue
+                    if n == 0:
+                        raise ConnectionError("连接已被设备关闭")
+                    last_receive = time.perf_counter()
+                    for frame in decoder.feed(self.view[:n]):
+                        parsed = self.parse(frame.payload)
+                        if parsed is None:
+                            errors += 1
+                        else:
+                            received.add(parsed[0])
+        finally:
+            sock.setblocking(True)
+
+        elapsed = max(last_receive - start, 1e-6)
+        return {
+            "throughput_bps": round(len(received) * self.line_size / elapsed),
+            "bulk_sent": sent,
+            "bulk_loss": 1 - len(received) / sent if sent else None,
+            "bulk_errors": errors,
+        }
+
+
+def format_benchmark_result(result):
+    """将单个参数组合的测试结果格式化为一行文本"""
+    def ms(value):
+        return "-" if value is None else f"{value:.1f}"
+
+    loss = result.get("bulk_loss")
+    return (f"{result['baudrate']} {result['parity']}: "
+            f"RTT p50/p90/p99 {ms(result['rtt_p50_ms'])}/{ms(result['rtt_p90_ms'])}/{ms(result['rtt_p99_ms'])} ms, "
+            f"吞吐 {result['throughput_bps']} B/s, "
+            f"丢失 {'-' if loss is None else f'{loss:.1%}'}")
+
+
+def preferred_ip(device_info):
+    """按广播信息选择设备地址：已连接时优先STA IP，其次AP IP"""
+    if device_info.get('connected', False) and 'sta_ip' in device_info:
+        return device_info['sta_ip']
+    return device_info.get('ap_ip')
+
+
+def device_addresses(device_info):
+    """设备所有已知地址，按优先顺序去重：STA IP(已连接时)、广播来源地址、AP IP"""
+    addresses = []
+    if device_info.get('connected', False):
+        addresses.append(device_info.get('sta_ip'))
+    addresses.append(device_info.get('addr'))
+    addresses.append(device_info.get('ap_ip'))
+    return [ip for index, ip in enumerate(addresses) if ip and ip not in addresses[:index]]
+
+
+class ReachabilityCache:
+    """设备地址可达性探测与路由缓存
+
+    对设备的所有已知地址发起TCP连接探测(happy eyeballs：按优先顺序每隔
+    stagger 秒启动下一个，前一个失败则立即启动，先连通者胜出)，
+    连通的地址还要通过 /api 确认设备ID(所有设备的AP地址都是192.168.4.1，
+    可能连到的是另一台设备)，确认后缓存 ttl 秒；请求失败时调用 invalidate 重新探测。
+    只探测HTTP端口，端口23同时只接受一个客户端，不能用于探测。
+    """
+
+    IN_PROGRESS = (0, errno.EINPROGRESS, errno.EWOULDBLOCK, getattr(errno, "WSAEWOULDBLOCK", 10035))
+
+    def __init__(self, port=80, ttl=60.0, stagger=0.25, timeout=2.0):
+        self.port = port
+        self.ttl = ttl
+        self.stagger = stagger
+        self.timeout = timeout
+        self.routes = {}  # 设备ID -> (地址, 过期时间)
+        self.lock = threading.Lock()
+
+    def cached(self, device_id):
+        """返回未过期的缓存地址，没有则返回None"""
+        with self.lock:
+            route = self.routes.get(device_id)
+        if route and route[1] > time.monotonic():
+            return route[0]
+        return None
+
+    def resolve(self, device_id, addresses):
+        """返回设备当前可用的地址，缓存失效时重新探测；全部不可达时返回None"""
+        ip = self.cached(device_id)
+        if ip in addresses:
+            return ip
+
+        candidates = list(addresses)
+        while candidates:
+            ip = self.probe(candidates)
+            if not ip:
+                break
+            if self.verify(device_id, ip):
+                with self.lock:
+                    self.routes[device_id] = (ip, time.monotonic() + self.ttl)
+                return ip
+            # 该地址上是其他设备，换下一个地址
+            candidates.remove(ip)
+
+        self.invalidate(device_id)
+        return None
+
+    def verify(self, device_id, ip):
+        """确认地址上响应的确实是该设备"""
+        try:
+            response = requests.get(f"http://{ip}:{self.port}/api", timeout=self.timeout)
+            return response.json().get('device', {}).get('id') == device_id
+        except Exception:
+            return False
+
+    def invalidate(self, device_id):
+        """丢弃缓存的路由，下次使用时重新探测"""
+        with self.lock:
+            self.routes.pop(device_id, None)
+
+    def probe(self, addresses):
+        """并发探测多个地址，返回最先连通的地址"""
+        pending = list(addresses)
+        attempts = {}  # socket -> 地址
+        deadline = time.monotonic() + self.timeout
+        next_start = time.monotonic()
+        try:
+            while pending or attempts:
+                now = time.monotonic()
+                if now >= deadline:
+                    break
+
+                # 到达错开时间，或没有进行中的探测时，启动下一个地址
+                if pending and (now >= next_start or not attempts):
+                    ip = pending.pop(0)
+                    next_start = now + self.stagger
+                    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                    sock.setblocking(False)
+                    try:
+                        result = sock.connect_ex((ip, self.port))
+                    except OSError:
+                        result = None
+                    if result == 0:
+                        sock.close()
+                        return ip
+                    if result in self.IN_PROGRESS:
+                        attempts[sock] = ip
+                    else:
+                        sock.close()
+                        next_start = now
+                    continue
+
+                wait = (min(next_start, deadline) if pending else deadline) - now
+                sockets = list(attempts)
+                _, writable, failed = select.select([], sockets, sockets, max(0, wait))
+                for sock in set(writable) | set(failed):
+                    ip = attempts.pop(sock)
+                    connected = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR) == 0
+                    sock.close()
+                    if connected:
+                        return ip
+                    # 探测失败，立即启动下一个地址
+                    next_start = time.monotonic()
+            return None
+        finally:
+            for sock in attempts:
+                sock.close()
+
+
+def is_connect_failure(error):
+    """请求是否失败在建立连接阶段(此时请求一定没有发送到设备)"""
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    return isinstance(reason, NewConnectionError)
+
+
+def request_device(reachability, device_id, device_info, method, path, **kwargs):
+    """通过可达地址向设备发送HTTP请求
+
+    失败时丢弃缓存的路由。只有连接未建立时才重新探测并换用其他地址重试一次，
+    请求发出后的断开或超时不重试，避免重置、重启等操作被执行两次。
+    """
+    for attempt in range(2):
+        ip = reachability.resolve(device_id, device_addresses(device_info))
+        if not ip:
+            raise requests.ConnectionError(f"设备 {device_id} 的所有地址均不可达")
+        try:
+            return requests.request(method, f"http://{ip}{path}", **kwargs)
+        except requests.RequestException as e:
+            reachability.invalidate(device_id)
+            if attempt or not is_connect_failure(e):
+                raise
+
+
+# 设备广播中的设备ID，分片模式下UI进程只用它分配分片，不做完整的JSON解析
+_BEACON_DEVICE_ID = re.compile(rb'"device_id"\s*:\s*"([^"\\]*)"')
+
+
+def beacon_device_id(data):
+    """从广播原始数据中提取设备ID，找不到时返回None"""
+    match = _BEACON_DEVICE_ID.search(data)
+    return match.group(1).decode(errors="replace") if match else None
+
+
+def shard_for(device_id, shard_count):
+    """按设备ID的CRC32分配分片，保证各进程计算结果一致"""
+    return zlib.crc32(device_id.encode()) % shard_count
+
+
+def shard_worker(conn, poll_interval=10.0, flush_interval=0.1, heartbeat_interval=5.0, expire_after=60.0):
+    """分片工作进程
+
+    负责本分片设备的广播解析、API轮询和端口23解码，套接字、HTTP会话和导出文件都只在本进程中。
+    收到的命令:
+        ("beacons", [(原始广播数据, addr, 接收时间), ...])
+        ("forget", [device_id, ...])
+        ("capture", device_id, ip, decoder_name, export_path)
+        ("stop_capture", device_id)
+        ("stop",)
+    以批量列表的形式向UI进程发送状态增量，广播内容不变时只在心跳中汇报最后活跃时间:
+        ("device", device_id, 变化的字段)
+        ("seen", [(device_id, last_seen), ...])
+        ("api", device_id, api_info)
+        ("frames", device_id, [(protocol, timestamp, payload), ...])
+        ("capture_stopped", device_id, error, frame_count)
+    """
+    devices = {}      # 设备ID -> 最近一次广播信息
+    last_seen = {}    # 设备ID -> 最近一次收到广播的时间
+    seen = set()      # 上次心跳后收到过广播的设备ID
+    api_cache = {}    # 设备ID -> 最近一次API信息
+    next_poll = {}    # 设备ID -> 下次轮询时间
+    polling = set()   # 正在轮询的设备ID
+    captures = {}     # 设备ID -> (reader, exporter)
+    outbox = []
+    frames = {}       # 设备ID -> 待发送的帧
+    lock = threading.Lock()
+    sessions = threading.local()
+    reachability = ReachabilityCache()
+    executor = ThreadPoolExecutor(max_workers=8)
+
+    def post(message):
+        with lock:
+            outbox.append(message)
+
+    def frame_sink(device_id, frame):
+        with lock:
+            frames.setdefault(device_id, []).append(tuple(frame))
+
+    def poll(device_id, device_info):
+        """在线程池中获取设备API信息，有变化时才发送"""
+        try:
+            ip = reachability.resolve(device_id, device_addresses(device_info))
+            if not ip:
+                return
+            if not hasattr(sessions, "session"):
+                sessions.session = requests.Session()
+            response = sessions.session.get(f"http://{ip}/api", timeout=5)
+            if response.status_code == 200:
+                api_info = response.json()
+                with lock:
+                    changed = api_cache.get(device_id) != api_info
+                    api_cache[device_id] = api_info
+                if changed:
+                    post(("api", device_id, api_info))
+        except Exception:
+            reachability.invalidate(device_id)
+        finally:
+            with lock:
+                polling.discard(device_id)
+
+    def capture_stopped(device_id, pipeline):
+        def on_stop(error):
+            with lock:
+                capture = captures.pop(device_id, None)
+            if capture and capture[1]:
+                capture[1].close()
+            post(("capture_stopped", device_id, error, pipeline.frame_count))
+        return on_stop
+
+    def forget(device_id):
+        devices.pop(device_id, None)
+        last_seen.pop(device_id, None)
+        seen.discard(device_id)
+        next_poll.pop(device_id, None)
+        with lock:
+            api_cache.pop(device_id, None)
+
+    def handle_beacon(data, addr, received_at):
+        try:
+            device_info = json.loads(data.decode())
+        except (ValueError, UnicodeDecodeError):
+            return
+        device_id = device_info.get('device_id') if isinstance(device_info, dict) else None
+        # 与单进程模式一致，忽略没有可用IP的广播；过期的广播(如重启后重放的)也忽略
+        if not device_id or not preferred_ip(device_info) or time.time() - received_at > expire_after:
+            return
+        device_info['addr'] = addr
+        previous = devices.get(device_id)
+        if previous is None:
+            changed = dict(device_info)
+        else:
+            changed = {key: value for key, value in device_info.items() if previous.get(key) != value}
+        devices[device_id] = device_info
+        last_seen[device_id] = max(received_at, last_seen.get(device_id, 0))
+        next_poll.setdefault(device_id, 0)
+        if changed:
+            changed['last_seen'] = last_seen[device_id]
+            post(("device", device_id, changed))
+        else:
+            seen.add(device_id)
+
+    def handle(command):
+        kind = command[0]
+        if kind == "beacons":
+            for data, addr, received_at in command[1]:
+                handle_beacon(data, addr, received_at)
+        elif kind == "forget":
+            for device_id in command[1]:
+                forget(device_id)
+        elif kind == "capture":
+            device_id, ip, decoder_name, export_path = command[1:]
+            if device_id in captures:
+                return
+            pipeline = DecoderPipeline(device_id, DECODERS[decoder_name](), [frame_sink])
+            exporter = None
+            try:
+                if export_path:
+                    exporter = FrameExporter(export_path)
+                    pipeline.add_sink(exporter)
+            except Exception as e:
+                post(("capture_stopped", device_id, str(e), 0))
+                return
+            reader = BridgeStreamReader(ip, pipeline, on_stop=capture_stopped(device_id, pipeline))
+            captures[device_id] = (reader, exporter)
+            reader.start()
+        elif kind == "stop_capture":
+            capture = captures.get(command[1])
+            if capture:
+                capture[0].stop()
+
+    running = True
+    last_flush = last_heartbeat = time.time()
+    try:
+        while running:
+            if conn.poll(flush_interval):
+                command = conn.recv()
+                if command[0] == "stop":
+                    running = False
+                else:
+                    handle(command)
+
+            now = time.time()
+            for device_id in list(devices):
+                if now - last_seen[device_id] > expire_after:
+                    # 长时间未收到广播，停止轮询
+                    forget(device_id)
+                elif now >= next_poll[device_id] and device_id not in polling:
+                    next_poll[device_id] = now + poll_interval
+                    polling.add(device_id)
+                    executor.submit(poll, device_id, dict(devices[device_id]))
+
+            if now - last_heartbeat >= heartbeat_interval:
+                last_heartbeat = now
+                if seen:
+                    post(("seen", [(device_id, last_seen[device_id]) for device_id in seen]))
+                    seen.clear()
+
+            if now - last_flush >= flush_interval:
+                last_flush = now
+                with lock:
+                    # 先发送帧，保证"capture_stopped"在该设备最后的帧之后到达
+                    batch = [("frames", device_id, items) for device_id, items in frames.items()]
+                    batch.extend(outbox)
+                    del outbox[:]
+                    frames.clear()
+                if batch:
+                    conn.send(batch)
+    except (EOFError, OSError, KeyboardInterrupt):
+        # UI进程已退出
+        pass
+    finally:
+        capture_list = list(captures.values())
+        for reader, exporter in capture_list:
+            reader.stop()
+        # 读取线程最多阻塞一个接收超时，等它们退出后关闭导出文件，保证缓冲的帧写入磁盘
+        for reader, exporter in capture_list:
+            if reader.thread:
+                reader.thread.join(timeout=2)
+            if exporter:
+                exporter.close()
+        executor.shutdown(wait=False)
+
+
+class ShardedBackend:
+    """多进程分片后端
+
+    按设备ID哈希把设备分配到多个工作进程，各进程独立完成广播解析、轮询和解码，
+    通过管道批量回传状态增量。UI进程只提取设备ID并按刷新周期批量转发原始广播。
+    工作进程崩溃时只影响本分片，监控线程会自动重启它，并重放仍在有效期内的广播
+    (带原始接收时间)以恢复设备列表。
+    """
+
+    def __init__(self, shard_count, on_batch, flush_interval=0.1, expire_after=60.0):
+        self.shard_count = shard_count
+        self.on_batch = on_batch  # 在监控线程中调用 on_batch(messages)
+        self.flush_interval = flush_interval
+        self.expire_after = expire_after
+        self.context = multiprocessing.get_context("spawn")
+        self.processes = [None] * shard_count
+        self.connections = [None] * shard_count
+        self.send_locks = [threading.Lock() for _ in range(shard_count)]
+        self.beacon_lock = threading.Lock()
+        self.pending = [[] for _ in range(shard_count)]  # 每个分片待转发的广播
+        self.beacons = {}   # 设备ID -> (原始广播数据, addr, 接收时间)，用于重启分片后恢复
+        self.captures = {}  # 设备ID -> 所在分片
+        self.running = False
+        self.monitor_thread = None
+
+    def start(self):
+        for index in range(self.shard_count):
+            self.spawn(index)
+        self.running = True
+        self.monitor_thread = threading.Thread(target=self.monitor, daemon=True)
+        self.monitor_thread.start()
+
+    def spawn(self, index):
+        """启动(或重启)一个分片工作进程"""
+        parent_conn, child_conn = self.context.Pipe()
+        process = self.context.Process(target=shard_worker, args=(child_conn,),
+                                       kwargs={"expire_after": self.expire_after}, daemon=True,
+                                       name=f"esp8266-shard-{index}")
+        process.start()
+        child_conn.close()
+        self.processes[index] = process
+        self.connections[index] = parent_conn
+
+    def send(self, index, message):
+        """向分片发送命令，进程已退出时忽略(由监控线程负责重启)"""
+        with self.send_locks[index]:
+            try:
+                self.connections[index].send(message)
+                return True
+            except (OSError, ValueError):
+                return False
+
+    def route_beacon(self, device_id, data, addr):
+        """记录设备的原始广播，等待下一个刷新周期批量转发给对应分片"""
+        beacon = (data, addr, time.time())
+        with self.beacon_lock:
+            self.beacons[device_id] = beacon
+            self.pending[shard_for(device_id, self.shard_count)].append(beacon)
+
+    def flush_beacons(self):
+        """把各分片积累的广播一次性发送出去"""
+        for index in range(self.shard_count):
+            with self.beacon_lock:
+                batch, self.pending[index] = self.pending[index], []
+            if batch:
+                self.send(index, ("beacons", batch))
+
+    def prune_beacons(self):
+        """丢弃已超过有效期的广播缓存"""
+        expired_before = time.time() - self.expire_after
+        with self.beacon_lock:
+            for device_id in [device_id for device_id, beacon in self.beacons.items() if beacon[2] < expired_before]:
+                del self.beacons[device_id]
+
+    def forget(self, device_ids):
+        """设备被UI移除时，同时从广播缓存和所在分片中移除"""
+        by_shard = {}
+        with self.beacon_lock:
+            for device_id in device_ids:
+                self.beacons.pop(device_id, None)
+                by_shard.setdefault(shard_for(device_id, self.shard_count), []).append(device_id)
+        for index, ids in by_shard.items():
+            self.send(index, ("forget", ids))
+
+    def start_capture(self, device_id, ip, decoder_name, export_path):
+        index = shard_for(device_id, self.shard_count)
+        self.captures[device_id] = index
+        self.send(index, ("capture", device_id, ip, decoder_name, export_path))
+
+    def stop_capture(self, device_id):
+        index = self.captures.get(device_id)
+        if index is not None:
+            self.send(index, ("stop_capture", device_id))
+
+    def monitor(self):
+        """监控线程：转发广播、接收各分片的增量，并重启异常退出的分片"""
+        last_prune = time.time()
+        while self.running:
+            self.flush_beacons()
+            if time.time() - last_prune > 5:
+                last_prune = time.time()
+                self.prune_beacons()
+
+            waitables = {}
+            for index in range(self.shard_count):
+                waitables[self.connections[index]] = index
+                waitables[self.processes[index].sentinel] = index
+            for ready in multiprocessing.connection.wait(list(waitables), timeout=self.flush_interval):
+                index = waitables[ready]
+                if ready is self.connections[index]:
+                    try:
+                        self.handle_batch(ready.recv())
+                        continue
+                    except (EOFError, OSError):
+                        pass  # 管道断开，说明工作进程已退出
+                # 工作进程退出，重启后重新收集等待对象
+                self.restart(index)
+                break
+
+    def handle_batch(self, batch):
+        for message in batch:
+            if message[0] == "capture_stopped":
+                self.captures.pop(message[1], None)
+        self.on_batch(batch)
+
+    def restart(self, index):
+        """重启崩溃的分片，并重放仍在有效期内的广播以恢复设备"""
+        if not self.running:
+            return
+        process = self.processes[index]
+        process.join(timeout=1)
+        if process.is_alive():
+            process.terminate()
+        exitcode = process.exitcode
+        self.connections[index].close()
+
+        lost = [device_id for device_id, shard in list(self.captures.items()) if shard == index]
+        for device_id in lost:
+            del self.captures[device_id]
+        self.on_batch([("shard_restarted", index, exitcode)] +
+                      [("capture_stopped", device_id, "工作进程异常退出", None) for device_id in lost])
+
+        self.spawn(index)
+        self.prune_beacons()
+        with self.beacon_lock:
+            # 缓存中已包含待转发的广播，清空待发送列表避免重复
+            self.pending[index] = []
+            replay = [beacon for device_id, beacon in self.beacons.items()
+                      if shard_for(device_id, self.shard_count) == index]
+        if replay:
+            self.send(index, ("beacons", replay))
+
+    def stop(self):
+        """通知所有分片退出"""
+        self.running = False
+        for index in range(self.shard_count):
+            self.send(index, ("stop",))
+        for process in self.processes:
+            # 留出时间让分片停止端口23读取并关闭导出文件
+            process.join(timeout=3)
+            if process.is_alive():
+                process.terminate()
+
+
+def atomic_write_json(path, data):
+    """先写入同目录下的临时文件再替换，避免写入中途崩溃导致文件损坏"""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(prefix=".tmp-", suffix=".json", dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+class ConfigStore:
+    """程序配置存储
+
+    启动时从磁盘加载一次，之后的读写都在内存中进行；修改后由后台定时器
+    防抖合并，延迟 delay 秒原子写入，UI事件处理中不再有磁盘操作。
+    同时保存串口/WiFi配置方案(profiles)。
+    """
+
+    PROFILE_KINDS = ("serial", "wifi")
+
+    def __init__(self, path, delay=1.0, on_error=None):
+        self.path = path
+        self.delay = delay
+        self.on_error = on_error  # 错误回调 on_error(message)，可能在后台线程中调用
+        self.lock = threading.RLock()
+        self.write_lock = threading.Lock()  # 保证多次写入按顺序完成
+        self.timer = None
+        self.dirty = False
+        self.data = self.load()
+
+    def default_config(self):
+        return {
+            "first_use": True,
+            "shard_workers": 0,
+            "profiles": {kind: {} for kind in self.PROFILE_KINDS},
+        }
+
+    def load(self):
+        """读取配置文件，文件不存在或损坏时使用默认配置"""
+        config = self.default_config()
+        try:
+            if os.path.exists(self.path):
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    loaded = json.load(f)
+                if isinstance(loaded, dict):
+                    config.update(loaded)
+                else:
+                    self.report("配置文件格式错误，已使用默认配置")
+        except Exception as e:
+            self.report(f"加载配置文件失败: {str(e)}")
+            
+        # 配置方案须为 {类型: {名称: 参数}}，格式错误的部分重置为空
+        profiles = config.get("profiles")
+        if not isinstance(profiles, dict):
+            self.report("配置方案格式错误，已重置")
+            profiles = config["profiles"] = {}
+        for kind in self.PROFILE_KINDS:
+            entries = profiles.get(kind)
+            if not isinstance(entries, dict):
+                if entries is not None:
+                    self.report(f"{kind} 配置方案格式错误，已重置")
+                profiles[kind] = {}
+                continue
+            for name in [name for name, values in entries.items() if not isinstance(values, dict)]:
+                self.report(f"{kind} 配置方案 '{name}' 格式错误，已忽略")
+                del entries[name]
+
+        # 分片进程数须为非负整数，否则不启用分片后端
+        shard_workers = config.get("shard_workers")
+        if isinstance(shard_workers, bool) or not isinstance(shard_workers, int) or shard_workers < 0:
+            self.report(f"配置项 shard_workers 无效: {shard_workers!r}，已使用默认值 0")
+            config["shard_workers"] = 0
+        return config
+
+    def report(self, message):
+        if self.on_error:
+            self.on_error(message)
+
+    def get(self, key, default=None):
+        with self.lock:
+            return self.data.get(key, default)
+
+    def set(self, key, value):
+        """修改配置项并安排后台保存"""
+        with self.lock:
+            self.data[key] = value
+            self.schedule_save()
+
+    def get_profiles(self, kind):
+        """返回某类配置方案的副本 {名称: 参数}"""
+        with self.lock:
+            return {name: dict(values) for name, values in self.data["profiles"][kind].items()}
+
+    def save_profile(self, kind, name, values):
+        with self.lock:
+            self.data["profiles"][kind][name] = dict(values)
+            self.schedule_save()
+
+    def delete_profile(self, kind, name):
+        with self.lock:
+            if self.data["profiles"][kind].pop(name, None) is not None:
+                self.schedule_save()
+
+    def schedule_save(self):
+        """防抖：delay 秒内的多次修改只写入一次"""
+        with self.lock:
+            self.dirty = True
+            if self.timer:
+                self.timer.cancel()
+            self.timer = threading.Timer(self.delay, self.flush)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def flush(self):
+        """立即保存待写入的修改，返回是否成功"""
+        with self.write_lock:
+            with self.lock:
+                if self.timer:
+                    self.timer.cancel()
+                    self.timer = None
+                if not self.dirty:
+                    return True
+                snapshot = json.loads(json.dumps(self.data))
+                self.dirty = False
+            try:
+                atomic_write_json(self.path, snapshot)
+                return True
+            except Exception as e:
+                with self.lock:
+                    self.dirty = True
+                self.report(f"保存配置文件失败: {str(e)}")
+                return False
+
 
 class ESP8266Manager:
     def __init__(self, root):
@@ -28,10 +1293,33 @@ class ESP8266Manager:
         # 标记用户是否正在编辑串口设置
         self.editing_serial = False
         
+        # 设备可达地址缓存，API、终端和解码都使用探测到的可用地址
+        self.reachability = ReachabilityCache()
+        
         # 程序配置文件路径
         self.config_dir = os.path.join(os.path.expanduser("~"), ".esp8266_manager")
         self.config_file = os.path.join(self.config_dir, "config.json")
         
+        # 配置只在启动时读取一次，修改在后台合并后写入(日志框创建前的错误延后显示)
+        self.config = ConfigStore(self.config_file,
+                                  on_error=lambda message: self.root.after(0, lambda: self.log(message)))
+        # 配置方案下拉框，键为方案类型(serial/wifi)
+        self.profile_choices = {}
+        
+        # 端口23数据解码：正在进行的捕获，键为设备ID
+        self.captures = {}
+        # 解码线程产生的帧先放入有界队列，由UI线程批量显示；显示跟不上时丢弃并计数
+        self.frame_queue = queue.Queue(maxsize=5000)
+        self.dropped_frames = 0
+        self.dropped_lock = threading.Lock()
+        
+        # 正在进行链路测试的设备ID
+        self.benchmarks = set()
+        
+        # 多进程分片后端(配置项 shard_workers 大于0时启用)，增量由UI线程批量应用
+        self.backend = None
+        self.delta_queue = queue.Queue()
+        
         # 创建UDP监听线程
         self.udp_running = True
         self.udp_thread = threading.Thread(target=self.udp_listener)
@@ -43,9 +1331,20 @@ class ESP8266Manager:
         # 检查是否是首次使用
         self.check_first_use()
         
+        # 启动分片后端
+        shard_workers = self.config.get("shard_workers", 0)
+        if shard_workers > 0:
+            self.backend = ShardedBackend(shard_workers, self.delta_queue.put)
+            self.backend.start()
+            self.log(f"已启用多进程分片后端，共 {shard_workers} 个工作进程")
+            self.root.after(100, self.apply_backend_deltas)
+        
         # 启动UDP监听
         self.udp_thread.start()
         
+        # 定时刷新解码帧显示
+        self.root.after(100, self.drain_frame_queue)
+        
     def create_ui(self):
         # 创建主框架，这个框架支持滚动
         self.canvas = tk.Canvas(self.root)
@@ -136,20 +1435,22 @@ class ESP8266Manager:
         wifi_save = ttk.Button(wifi_frame, text="保存WiFi设置", command=self.save_wifi)
         wifi_save.grid(row=3, column=0, columnspan=2, padx=2, pady=2, sticky=tk.W+tk.E)
         
+        self.create_profile_row(wifi_frame, 4, "wifi")
+        
         
         # 串口配置
         serial_frame = ttk.LabelFrame(config_frame, text="串口配置", padding="5")
         serial_frame.pack(fill=tk.X, padx=2, pady=2)
         
         ttk.Label(serial_frame, text="波特率:").grid(row=0, column=0, sticky=tk.W, padx=2, pady=2)
-        self.baudrate = ttk.Combobox(serial_frame, values=["9600", "19200", "38400", "57600", "115200"])
+        self.baudrate = ttk.Combobox(serial_frame, values=SERIAL_BAUDRATES)
         self.baudrate.grid(row=0, column=1, sticky=tk.W+tk.E, padx=2, pady=2)
         # 添加焦点事件处理
         self.baudrate.bind("<FocusIn>", lambda event: self.set_editing_serial(True))
         self.baudrate.bind("<FocusOut>", lambda event: self.set_editing_serial(False))
         
         ttk.Label(serial_frame, text="校验位:").grid(row=1, column=0, sticky=tk.W, padx=2, pady=2)
-        self.parity = ttk.Combobox(serial_frame, values=["N", "E", "O"])
+        self.parity = ttk.Combobox(serial_frame, values=SERIAL_PARITIES)
         self.parity.grid(row=1, column=1, sticky=tk.W+tk.E, padx=2, pady=2)
         # 添加焦点事件处理
         self.parity.bind("<FocusIn>", lambda event: self.set_editing_serial(True))
@@ -158,6 +1459,8 @@ class ESP8266Manager:
         serial_save = ttk.Button(serial_frame, text="保存串口设置", command=self.save_serial)
         serial_save.grid(row=2, column=0, columnspan=2, padx=2, pady=2, sticky=tk.W+tk.E)
         
+        self.create_profile_row(serial_frame, 3, "serial")
+        
         # 操作按钮
         action_frame = ttk.Frame(config_frame, padding="5")
         action_frame.pack(fill=tk.X, padx=2, pady=2)
@@ -169,6 +1472,9 @@ class ESP8266Manager:
         restart_button = ttk.Button(top_buttons, text="重启设备", command=self.restart_device)
         restart_button.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=2, pady=2)
         
+        benchmark_button = ttk.Button(top_buttons, text="链路测试", command=self.run_bridge_benchmark)
+        benchmark_button.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=2, pady=2)
+        
         # connect_serial = ttk.Button(top_buttons, text="连接到Telnet终端", command=self.connect_telnet)
         # connect_serial.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=2, pady=2)
         
@@ -186,6 +1492,28 @@ class ESP8266Manager:
         self.root.style = ttk.Style()
         self.root.style.configure("Danger.TButton", foreground="red")
         
+        # 串口数据解码框架
+        decode_frame = ttk.LabelFrame(right_frame, text="串口数据解码", padding="5")
+        decode_frame.pack(fill=tk.BOTH, expand=True, padx=2, pady=2)
+        
+        decode_controls = ttk.Frame(decode_frame)
+        decode_controls.pack(fill=tk.X)
+        
+        ttk.Label(decode_controls, text="协议:").pack(side=tk.LEFT, padx=2)
+        self.decoder_choice = ttk.Combobox(decode_controls, values=list(DECODERS), state="readonly", width=16)
+        self.decoder_choice.set("文本行")
+        self.decoder_choice.pack(side=tk.LEFT, padx=2)
+        
+        self.export_frames = tk.BooleanVar(value=False)
+        ttk.Checkbutton(decode_controls, text="导出到文件", variable=self.export_frames).pack(side=tk.LEFT, padx=2)
+        
+        ttk.Button(decode_controls, text="停止解码", command=self.stop_capture).pack(side=tk.RIGHT, padx=2)
+        ttk.Button(decode_controls, text="开始解码", command=self.start_capture).pack(side=tk.RIGHT, padx=2)
+        
+        self.frame_text = scrolledtext.ScrolledText(decode_frame, height=8)
+        self.frame_text.pack(fill=tk.BOTH, expand=True, padx=2, pady=2)
+        self.frame_text.config(state=tk.DISABLED)
+        
         # 日志框架
         log_frame = ttk.LabelFrame(right_frame, text="日志", padding="5")
         log_frame.pack(fill=tk.BOTH, expand=True, padx=2, pady=2)
@@ -194,42 +1522,83 @@ class ESP8266Manager:
         self.log_text.pack(fill=tk.BOTH, expand=True, padx=2, pady=2)
         self.log_text.config(state=tk.DISABLED)
         
-    def load_config(self):
-        """加载程序配置"""
-        try:
-            if not os.path.exists(self.config_dir):
-                os.makedirs(self.config_dir)
-                
-            if os.path.exists(self.config_file):
-                with open(self.config_file, 'r') as f:
-                    return json.load(f)
-        except Exception as e:
-            self.log(f"加载配置文件失败: {str(e)}")
-        
-        # 默认配置
-        return {
-            "first_use": True
-        }
-        
-    def save_config(self, config):
-        """保存程序配置"""
-        try:
-            if not os.path.exists(self.config_dir):
-                os.makedirs(self.config_dir)
-                
-            with open(self.config_file, 'w') as f:
-                json.dump(config, f)
-                
-            return True
-        except Exception as e:
-            self.log(f"保存配置文件失败: {str(e)}")
-            return False
+    def create_profile_row(self, parent, row, kind):
+        """在WiFi/串口配置框中添加配置方案选择行"""
+        profile_frame = ttk.Frame(parent)
+        profile_frame.grid(row=row, column=0, columnspan=2, padx=2, pady=2, sticky=tk.W+tk.E)
+        
+        ttk.Label(profile_frame, text="配置方案:").pack(side=tk.LEFT, padx=2)
+        choice = ttk.Combobox(profile_frame, state="readonly", width=16)
+        choice.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=2)
+        
+        ttk.Button(profile_frame, text="应用到设备", command=lambda: self.apply_profile(kind)).pack(side=tk.LEFT, padx=1)
+        ttk.Button(profile_frame, text="另存为", command=lambda: self.save_profile(kind)).pack(side=tk.LEFT, padx=1)
+        ttk.Button(profile_frame, text="删除", command=lambda: self.delete_profile(kind)).pack(side=tk.LEFT, padx=1)
+        
+        self.profile_choices[kind] = choice
+        self.refresh_profile_choices(kind)
+        
+    def refresh_profile_choices(self, kind, selected=None):
+        """刷新配置方案下拉列表"""
+        choice = self.profile_choices[kind]
+        names = sorted(self.config.get_profiles(kind))
+        choice.configure(values=names)
+        if selected in names:
+            choice.set(selected)
+        elif choice.get() not in names:
+            choice.set("")
+            
+    def current_profile_values(self, kind):
+        """读取界面上当前的WiFi或串口参数"""
+        if kind == "wifi":
+            return {"ssid": self.wifi_ssid.get(), "password": self.wifi_password.get()}
+        return {"baudrate": self.baudrate.get(), "parity": self.parity.get()}
+        
+    def save_profile(self, kind):
+        """把界面上的参数保存为命名配置方案"""
+        values = self.current_profile_values(kind)
+        if kind == "wifi" and not values["ssid"]:
+            messagebox.showerror("错误", "SSID不能为空")
+            return
+            
+        name = simpledialog.askstring("保存配置方案", "方案名称:", parent=self.root,
+                                      initialvalue=self.profile_choices[kind].get())
+        if not name:
+            return
+            
+        self.config.save_profile(kind, name, values)
+        self.refresh_profile_choices(kind, name)
+        self.log(f"配置方案 '{name}' 已保存")
+        
+    def apply_profile(self, kind):
+        """把选中的配置方案填入界面并保存到当前设备"""
+        name = self.profile_choices[kind].get()
+        values = self.config.get_profiles(kind).get(name)
+        if not values:
+            messagebox.showerror("错误", "请先选择一个配置方案")
+            return
+            
+        if kind == "wifi":
+            self.wifi_ssid.delete(0, tk.END)
+            self.wifi_ssid.insert(0, values.get("ssid", ""))
+            self.wifi_password.delete(0, tk.END)
+            self.wifi_password.insert(0, values.get("password", ""))
+            self.save_wifi()
+        else:
+            self.baudrate.set(values.get("baudrate", "9600"))
+            self.parity.set(values.get("parity", "N"))
+            self.save_serial()
+            
+    def delete_profile(self, kind):
+        """删除选中的配置方案"""
+        name = self.profile_choices[kind].get()
+        if name and messagebox.askyesno("确认", f"确认要删除配置方案 '{name}' 吗?"):
+            self.config.delete_profile(kind, name)
+            self.refresh_profile_choices(kind)
             
     def check_first_use(self):
         """检查是否是首次使用"""
-        config = self.load_config()
-        
-        if config.get("first_use", True):
+        if self.config.get("first_use", True):
             self.log("欢迎使用ESP8266管理工具！")
             self.log("首次使用：请点击'连接设备AP向导'按钮进行设置")
             
@@ -237,8 +1606,7 @@ class ESP8266Manager:
             self.show_ap_wizard()
             
             # 更新配置，标记已不是首次使用
-            config["first_use"] = False
-            self.save_config(config)
+            self.config.set("first_use", False)
         
     def show_ap_wizard(self):
         """显示连接设备AP的向导"""
@@ -284,16 +1652,16 @@ class ESP8266Manager:
     
     def set_show_wizard(self, show_again):
         """设置是否再次显示向导"""
-        config = self.load_config()
-        config["first_use"] = show_again
-        self.save_config(config)
+        self.config.set("first_use", show_again)
         
-    def show_available_wifi(self):
+    def show_available_wifi(self, ip=None):
         """显示设备可用的WiFi列表"""
-        ip = self.get_device_ip()
-        if not ip:
+        if ip is None:
+            self.with_device_ip(self.show_available_wifi)
             return
             
+        device_id = self.selected_device
+        
         try:
             # 创建一个新窗口
             wifi_window = tk.Toplevel(self.root)
@@ -309,7 +1677,7 @@ class ESP8266Manager:
             def get_wifi_list():
                 try:
                     # 发送API请求获取WiFi列表
-                    response = requests.get(f"http://{ip}/api/wifi/scan", timeout=10)
+                    response = self.device_request("GET", "/api/wifi/scan", device_id=device_id, timeout=10)
                     
                     if response.status_code == 200:
                         wifi_data = response.json()
@@ -407,6 +1775,13 @@ class ESP8266Manager:
                     # 接收数据
                     data, addr = sock.recvfrom(1024)
                     
+                    if self.backend:
+                        # 分片模式下只提取设备ID，JSON由对应的工作进程解析
+                        device_id = beacon_device_id(data)
+                        if device_id:
+                            self.backend.route_beacon(device_id, data, addr[0])
+                        continue
+                    
                     # 解析JSON
                     try:
                         device_info = json.loads(data.decode())
@@ -428,11 +1803,7 @@ class ESP8266Manager:
             device_id = device_info['device_id']
             
             # 提取IP地址
-            ip = None
-            if 'sta_ip' in device_info and device_info.get('connected', False):
-                ip = device_info['sta_ip']
-            elif 'ap_ip' in device_info:
-                ip = device_info['ap_ip']
+            ip = preferred_ip(device_info)
             
             # 如果找到有效IP
             if ip:
@@ -463,8 +1834,8 @@ class ESP8266Manager:
             
         # 添加设备到列表
         for device_id, device_info in self.devices.items():
-            # 获取IP地址
-            ip = device_info.get('sta_ip', device_info.get('ap_ip', 'Unknown'))
+            # 获取IP地址(优先显示探测到的可达地址)
+            ip = self.reachability.cached(device_id) or device_info.get('sta_ip', device_info.get('ap_ip', 'Unknown'))
             
             # 插入设备
             self.device_tree.insert('', tk.END, iid=device_id, values=(device_id, ip))
@@ -473,42 +1844,117 @@ class ESP8266Manager:
         if self.selected_device in self.devices:
             self.device_tree.selection_set(self.selected_device)
             
+    def update_device_row(self, device_id):
+        """只更新单个设备所在的行，避免设备很多时整表重建"""
+        device_info = self.devices[device_id]
+        ip = self.reachability.cached(device_id) or device_info.get('sta_ip', device_info.get('ap_ip', 'Unknown'))
+        
+        if self.device_tree.exists(device_id):
+            self.device_tree.item(device_id, values=(device_id, ip))
+        else:
+            self.device_tree.insert('', tk.END, iid=device_id, values=(device_id, ip))
+            
+    def apply_backend_deltas(self):
+        """应用分片工作进程回传的状态增量"""
+        changed = set()
+        try:
+            while True:
+                for message in self.delta_queue.get_nowait():
+                    kind = message[0]
+                    if kind == "device":
+                        device_id, fields = message[1], message[2]
+                        if device_id not in self.devices:
+                            # 工作进程对新设备发送完整的广播信息
+                            ip = preferred_ip(fields)
+                            if not ip:
+                                continue
+                            self.devices[device_id] = {}
+                            self.log(f"发现新设备: {device_id} 在 {ip}")
+                        fields['last_seen'] = datetime.fromtimestamp(fields['last_seen'])
+                        self.devices[device_id].update(fields)
+                        changed.add(device_id)
+                    elif kind == "seen":
+                        # 心跳只更新最后活跃时间，不需要刷新列表
+                        for device_id, last_seen in message[1]:
+                            if device_id in self.devices:
+                                self.devices[device_id]['last_seen'] = datetime.fromtimestamp(last_seen)
+                                if device_id == self.selected_device:
+                                    changed.add(device_id)
+                    elif kind == "api":
+                        device_id = message[1]
+                        if device_id in self.devices:
+                            self.devices[device_id]['api'] = message[2]
+                            changed.add(device_id)
+                        if device_id == self.selected_device:
+                            self.device_api_info = message[2]
+                    elif kind == "frames":
+                        for item in message[2]:
+                            self.queue_frame(message[1], Frame._make(item))
+                    elif kind == "capture_stopped":
+                        self.on_capture_stopped(*message[1:])
+                    elif kind == "shard_restarted":
+                        self.log(f"工作进程 {message[1]} 异常退出(退出码: {message[2]})，已重启")
+        except queue.Empty:
+            pass
+            
+        for device_id in changed:
+            self.update_device_row(device_id)
+        if self.selected_device in changed:
+            self.update_device_info()
+            
+        self.root.after(100, self.apply_backend_deltas)
+        
     def on_device_select(self, event):
         """设备选择事件处理"""
         selection = self.device_tree.selection()
         if selection:
+            if selection[0] != self.selected_device:
+                # 切换设备时清除上一台设备的API信息
+                self.device_api_info = None
             self.selected_device = selection[0]
             # 获取最新的设备API信息
             self.fetch_device_api_info()
             
     def fetch_device_api_info(self):
-        """获取设备的API详细信息"""
-        if not self.selected_device or self.selected_device not in self.devices:
+        """获取设备的API详细信息(地址探测可能较慢，在后台线程中进行)"""
+        device_id = self.selected_device
+        if not device_id or device_id not in self.devices:
             return
             
-        ip = self.get_device_ip()
-        if not ip:
-            return
-            
-        try:
-            # 发送请求获取API信息
-            response = requests.get(f"http://{ip}/api", timeout=5)
-            
-            if response.status_code == 200:
-                self.device_api_info = response.json()
+        device_info = dict(self.devices[device_id])
+        
+        def worker():
+            try:
+                # 发送请求获取API信息
+                response = request_device(self.reachability, device_id, device_info, "GET", "/api", timeout=5)
                 
-                # 只在首次选择设备时更新串口设置UI
-                if not self.editing_serial and 'serial' in self.device_api_info:
-                    serial_info = self.device_api_info['serial']
-                    self.baudrate.set(serial_info.get('baudrate', '9600'))
-                    self.parity.set(serial_info.get('parity', 'N'))
+                if response.status_code == 200:
+                    api_info = response.json()
+                    self.root.after(0, lambda: self.on_api_info(device_id, api_info))
+                else:
+                    message = f"获取设备API信息失败: HTTP {response.status_code}"
+                    self.root.after(0, lambda: self.log(message))
+            except Exception as e:
+                message = f"连接设备API失败: {str(e)}"
+                self.root.after(0, lambda: self.log(message))
                 
-                # 更新设备信息显示
-                self.update_device_info()
-            else:
-                self.log(f"获取设备API信息失败: HTTP {response.status_code}")
-        except Exception as e:
-            self.log(f"连接设备API失败: {str(e)}")
+        threading.Thread(target=worker, daemon=True).start()
+        
+    def on_api_info(self, device_id, api_info):
+        """显示后台获取的API信息(在UI线程中执行)"""
+        if device_id != self.selected_device:
+            return
+            
+        self.device_api_info = api_info
+        
+        # 只在首次选择设备时更新串口设置UI
+        if not self.editing_serial and 'serial' in self.device_api_info:
+            serial_info = self.device_api_info['serial']
+            self.baudrate.set(serial_info.get('baudrate', '9600'))
+            self.parity.set(serial_info.get('parity', 'N'))
+        
+        # 更新设备信息显示
+        self.update_device_info()
         
     def update_device_info(self):
         """更新设备详情显示"""
@@ -571,31 +2017,64 @@ class ESP8266Manager:
             del self.devices[device_id]
             self.log(f"设备 {device_id} 已超时移除")
             
+        # 分片模式下同时让工作进程停止管理这些设备
+        if self.backend and to_remove:
+            self.backend.forget(to_remove)
+            
         self.update_device_list()
         self.log("设备列表已刷新")
         
-    def get_device_ip(self):
-        """获取当前选中设备的IP地址"""
+    def with_device_ip(self, action):
+        """获取当前选中设备的可达地址后在UI线程中调用 action(ip)
+
+        缓存的地址直接使用，否则在后台线程中同时探测STA IP、广播来源地址和AP IP，
+        避免地址探测阻塞界面；探测期间切换了设备则放弃本次操作。
+        """
         if not self.selected_device or self.selected_device not in self.devices:
             messagebox.showerror("错误", "请先选择一个设备")
-            return None
+            return
             
-        device_info = self.devices[self.selected_device]
-        
-        # 优先使用STA IP (如果已连接)
-        if device_info.get('connected', False) and 'sta_ip' in device_info:
-            return device_info['sta_ip']
-        
-        # 其次使用AP IP
-        if 'ap_ip' in device_info:
-            return device_info['ap_ip']
+        device_id = self.selected_device
+        addresses = device_addresses(self.devices[device_id])
+        ip = self.reachability.cached(device_id)
+        if ip in addresses:
+            action(ip)
+            return
             
-        return None
+        def done(ip):
+            if device_id != self.selected_device:
+                return
+            if not ip:
+                messagebox.showerror("错误", "设备的所有地址均不可达，请检查PC与设备是否在同一网络")
+                return
+            action(ip)
+            
+        def worker():
+            ip = self.reachability.resolve(device_id, addresses)
+            self.root.after(0, lambda: done(ip))
+            
+        self.log(f"正在探测设备 {device_id} 的可达地址...")
+        threading.Thread(target=worker, daemon=True).start()
+        
+    def device_request(self, method, path, device_id=None, ip=None, **kwargs):
+        """向设备(默认当前选中设备)发送API请求，连接失败时自动切换地址
+
+        UI线程中传入 with_device_ip 得到的地址，只向该地址发送，不在界面线程中重新探测；
+        失败时丢弃缓存的路由，下次操作时再在后台探测。
+        """
+        device_id = device_id or self.selected_device
+        if ip is None:
+            return request_device(self.reachability, device_id, self.devices[device_id], method, path, **kwargs)
+        try:
+            return requests.request(method, f"http://{ip}{path}", **kwargs)
+        except requests.RequestException:
+            self.reachability.invalidate(device_id)
+            raise
         
-    def save_wifi(self):
+    def save_wifi(self, ip=None):
         """保存WiFi设置"""
-        ip = self.get_device_ip()
-        if not ip:
+        if ip is None:
+            self.with_device_ip(self.save_wifi)
             return
             
         ssid = self.wifi_ssid.get()
@@ -613,7 +2092,7 @@ class ESP8266Manager:
             }
             
             # 发送请求
-            response = requests.post(f"http://{ip}/api/wifi", json=data, timeout=5)
+            response = self.device_request("POST", "/api/wifi", json=data, timeout=5, ip=ip)
             
             if response.status_code == 200:
                 result = response.json()
@@ -632,10 +2111,10 @@ class ESP8266Manager:
         except Exception as e:
             messagebox.showerror("错误", f"连接错误: {str(e)}")
             
-    def save_serial(self):
+    def save_serial(self, ip=None):
         """保存串口设置"""
-        ip = self.get_device_ip()
-        if not ip:
+        if ip is None:
+            self.with_device_ip(self.save_serial)
             return
             
         baudrate = self.baudrate.get()
@@ -649,7 +2128,7 @@ class ESP8266Manager:
             }
             
             # 发送请求
-            response = requests.post(f"http://{ip}/api/serial", json=data, timeout=5)
+            response = self.device_request("POST", "/api/serial", json=data, timeout=5, ip=ip)
             
             if response.status_code == 200:
                 result = response.json()
@@ -667,16 +2146,16 @@ class ESP8266Manager:
         except Exception as e:
             messagebox.showerror("错误", f"连接错误: {str(e)}")
             
-    def restart_device(self):
+    def restart_device(self, ip=None):
         """重启设备"""
-        ip = self.get_device_ip()
-        if not ip:
+        if ip is None:
+            self.with_device_ip(self.restart_device)
             return
             
         if messagebox.askyesno("确认", "确认要重启设备吗?"):
             try:
                 # 发送重启请求
-                response = requests.post(f"http://{ip}/api/restart", timeout=5)
+                response = self.device_request("POST", "/api/restart", timeout=5, ip=ip)
                 
                 if response.status_code == 200:
                     messagebox.showinfo("成功", "设备正在重启")
@@ -687,16 +2166,16 @@ class ESP8266Manager:
             except Exception as e:
                 messagebox.showerror("错误", f"连接错误: {str(e)}")
     
-    def reset_device_config(self):
+    def reset_device_config(self, ip=None):
         """重置设备配置"""
-        ip = self.get_device_ip()
-        if not ip:
+        if ip is None:
+            self.with_device_ip(self.reset_device_config)
             return
             
         if messagebox.askyesno("警告", "确认要重置设备所有配置吗？这将删除WiFi和串口设置，并重启设备。", icon='warning'):
             try:
                 # 发送重置请求
-                response = requests.post(f"http://{ip}/api/reset", timeout=5)
+                response = self.device_request("POST", "/api/reset", timeout=5, ip=ip)
                 
                 if response.status_code == 200:
                     messagebox.showinfo("成功", "设备配置已重置，设备正在重启")
@@ -707,10 +2186,10 @@ class ESP8266Manager:
             except Exception as e:
                 messagebox.showerror("错误", f"连接错误: {str(e)}")
                 
-    def connect_telnet(self):
+    def connect_telnet(self, ip=None):
         """连接Telnet终端"""
-        ip = self.get_device_ip()
-        if not ip:
+        if ip is None:
+            self.with_device_ip(self.connect_telnet)
             return
             
         # 在Windows上启动telnet客户端
@@ -720,6 +2199,227 @@ class ESP8266Manager:
         except Exception as e:
             messagebox.showerror("错误", f"无法启动Telnet: {str(e)}")
                 
+    def start_capture(self, ip=None):
+        """开始解码当前设备端口23的数据"""
+        if ip is None:
+            self.with_device_ip(self.start_capture)
+            return
+            
+        device_id = self.selected_device
+        if device_id in self.captures:
+            messagebox.showinfo("提示", f"设备 {device_id} 已在解码中")
+            return
+        if device_id in self.benchmarks:
+            messagebox.showerror("错误", f"设备 {device_id} 正在进行链路测试")
+            return
+            
+        decoder_name = self.decoder_choice.get()
+        
+        export_path = None
+        if self.export_frames.get():
+            try:
+                capture_dir = os.path.join(self.config_dir, "captures")
+                os.makedirs(capture_dir, exist_ok=True)
+                filename = f"{device_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl"
+                export_path = os.path.join(capture_dir, filename)
+            except Exception as e:
+                messagebox.showerror("错误", f"无法创建导出目录: {str(e)}")
+                return
+        
+        if self.backend:
+            # 分片模式下由设备所在的工作进程读取和解码
+            self.backend.start_capture(device_id, ip, decoder_name, export_path)
+            self.captures[device_id] = (None, None)
+        else:
+            pipeline = DecoderPipeline(device_id, DECODERS[decoder_name](), [self.queue_frame])
+            exporter = None
+            if export_path:
+                try:
+                    exporter = FrameExporter(export_path)
+                    pipeline.add_sink(exporter)
+                except Exception as e:
+                    messagebox.showerror("错误", f"无法创建导出文件: {str(e)}")
+                    return
+                    
+            reader = BridgeStreamReader(ip, pipeline,
+                                        on_stop=lambda error: self.root.after(0, lambda: self.on_capture_stopped(
+                                            device_id, error, pipeline.frame_count)))
+            self.captures[device_id] = (reader, exporter)
+            reader.start()
+        
+        self.log(f"开始解码设备 {device_id} ({ip}:23)，协议: {decoder_name}")
+        if export_path:
+            self.log(f"解码结果将导出到 {export_path}")
+            
+    def stop_capture(self):
+        """停止解码当前设备"""
+        capture = self.captures.get(self.selected_device)
+        if not capture:
+            return
+            
+        if self.backend:
+            self.backend.stop_capture(self.selected_device)
+        else:
+            capture[0].stop()
+            
+    def on_capture_stopped(self, device_id, error, frame_count):
+        """解码结束后的清理(在UI线程中执行)"""
+        capture = self.captures.pop(device_id, None)
+        if not capture:
+            return
+            
+        exporter = capture[1]
+        if exporter:
+            exporter.close()
+            
+        if error:
+            # 连接中断可能是地址已不可达，下次重新探测
+            self.reachability.invalidate(device_id)
+            self.log(f"设备 {device_id} 解码中断: {error}")
+        else:
+            self.log(f"设备 {device_id} 已停止解码，共 {frame_count} 帧")
+            
+    def queue_frame(self, device_id, frame):
+        """解码管道输出：放入队列等待UI线程显示，队列已满时丢弃"""
+        try:
+            self.frame_queue.put_nowait((device_id, frame))
+        except queue.Full:
+            with self.dropped_lock:
+                self.dropped_frames += 1
+        
+    def drain_frame_queue(self):
+        """批量取出解码帧并显示，每次最多处理500帧"""
+        lines = []
+        try:
+            while len(lines) < 500:
+                device_id, frame = self.frame_queue.get_nowait()
+                timestamp = datetime.fromtimestamp(frame.timestamp).strftime("%H:%M:%S.%f")[:-3]
+                lines.append(f"[{timestamp}] {device_id} {describe_frame(frame)}\n")
+        except queue.Empty:
+            pass
+            
+        with self.dropped_lock:
+            dropped, self.dropped_frames = self.dropped_frames, 0
+        if dropped:
+            timestamp = datetime.now().strftime("%H:%M:%S.%f")[:-3]
+            lines.append(f"[{timestamp}] 显示跟不上，已丢弃 {dropped} 帧(导出文件不受影响)\n")
+            
+        if lines:
+            self.frame_text.config(state=tk.NORMAL)
+            self.frame_text.insert(tk.END, "".join(lines))
+            
+            # 只保留最近1000行
+            line_count = int(self.frame_text.index("end-1c").split(".")[0])
+            if line_count > 1000:
+                self.frame_text.delete("1.0", f"{line_count - 1000}.0")
+                
+            self.frame_text.see(tk.END)
+            self.frame_text.config(state=tk.DISABLED)
+            
+        self.root.after(100, self.drain_frame_queue)
+        
+    def run_bridge_benchmark(self, ip=None):
+        """对当前设备扫描所有串口参数，测量桥接延迟和吞吐"""
+        if ip is None:
+            self.with_device_ip(self.run_bridge_benchmark)
+            return
+            
+        device_id = self.selected_device
+        if device_id in self.benchmarks or device_id in self.captures:
+            messagebox.showerror("错误", f"设备 {device_id} 的端口23正在使用中")
+            return
+            
+        if not messagebox.askyesno("链路测试", "测试前请将目标串口的TX与RX短接(回环)。\n"
+                                   "测试将依次切换所有波特率和校验位组合，结束后恢复当前设置。\n是否开始？"):
+            return
+            
+        settings = [(baudrate, parity) for baudrate in SERIAL_BAUDRATES for parity in SERIAL_PARITIES]
+        benchmark = BridgeBenchmark(ip, progress=lambda message: self.root.after(0, lambda: self.log(message)))
+        self.benchmarks.add(device_id)
+        
+        def worker():
+            # 测试前从设备读取当前串口设置和固件版本，用于测试后恢复和结果对比；
+            # 读取失败时取消测试，避免把设备恢复成错误的设置
+            try:
+                api_info = benchmark.device_status(device_id)
+                serial_info = api_info['serial']
+                original = (serial_info['baudrate'], serial_info['parity'])
+                firmware = api_info['device'].get('firmware', 'unknown')
+            except Exception as e:
+                error = f"读取设备当前串口设置失败，测试已取消: {str(e)}"
+                self.root.after(0, lambda: self.on_benchmark_done(device_id, None, [], error))
+                return
+                
+            results = []
+            error = None
+            try:
+                results = benchmark.run(settings)
+            except Exception as e:
+                error = str(e)
+            finally:
+                try:
+                    benchmark.apply_serial(*original)
+                except Exception as e:
+                    error = error or f"恢复串口设置失败: {str(e)}"
+            self.root.after(0, lambda: self.on_benchmark_done(device_id, firmware, results, error))
+            
+        self.log(f"开始链路测试: 设备 {device_id} ({ip})，共 {len(settings)} 组参数")
+        threading.Thread(target=worker, daemon=True).start()
+        
+    def on_benchmark_done(self, device_id, firmware, results, error):
+        """链路测试结束：保存结果并与其他固件版本的结果对比"""
+        self.benchmarks.discard(device_id)
+        if error:
+            self.reachability.invalidate(device_id)
+            self.log(f"设备 {device_id} 链路测试出错: {error}")
+        if not results:
+            return
+            
+        history = self.load_benchmarks(device_id)
+        
+        # 找到最近一次其他固件版本的测试结果
+        previous = next((run for run in reversed(history) if run.get('firmware') != firmware), None)
+        if previous:
+            old_results = {(r['baudrate'], r['parity']): r for r in previous['results']}
+            self.log(f"与固件 {previous['firmware']} ({previous['time']}) 的结果对比:")
+            for result in results:
+                old = old_results.get((result['baudrate'], result['parity']))
+                if old:
+                    self.log(f"  旧 {format_benchmark_result(old)}")
+                    self.log(f"  新 {format_benchmark_result(result)}")
+                    
+        history.append({
+            "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "firmware": firmware,
+            "results": results,
+        })
+        if self.save_benchmarks(device_id, history[-20:]):
+            self.log(f"设备 {device_id} 链路测试完成，结果已保存")
+            
+    def benchmark_file(self, device_id):
+        """设备链路测试结果文件路径"""
+        return os.path.join(self.config_dir, "benchmarks", f"{device_id}.json")
+        
+    def load_benchmarks(self, device_id):
+        """加载设备的历史链路测试结果"""
+        try:
+            path = self.benchmark_file(device_id)
+            if os.path.exists(path):
+                with open(path, 'r') as f:
+                    return json.load(f)
+        except Exception as e:
+            self.log(f"加载链路测试结果失败: {str(e)}")
+        return []
+        
+    def save_benchmarks(self, device_id, history):
+        """保存设备的链路测试结果(最多保留20次)"""
+        try:
+            atomic_write_json(self.benchmark_file(device_id), history)
+            return True
+        except Exception as e:
+            self.log(f"保存链路测试结果失败: {str(e)}")
+            return False
+            
     def log(self, message):
         """添加日志消息"""
         timestamp = datetime.now().strftime("%H:%M:%S")
@@ -740,6 +2440,14 @@ class ESP8266Manager:
     def on_closing(self):
         """关闭窗口事件处理"""
         self.udp_running = False
+        for reader, exporter in self.captures.values():
+            if reader:
+                reader.stop()
+            if exporter:
+                exporter.close()
+        if self.backend:
+            self.backend.stop()
+        self.config.flush()
         self.root.destroy()
         
     def set_editing_serial(self, editing):
@@ -747,6 +2455,7 @@ class ESP8266Manager:
         self.editing_serial = editing
         
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     root = tk.Tk()
     app = ESP8266Manager(root)
     root.protocol("WM_DELETE_WINDOW", app.on_closing)
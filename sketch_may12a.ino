@@ -15,6 +15,7 @@
 #define UDP_PORT       8266
 #define BLINK_SLOW     1000  // 慢闪 1000ms
 #define BLINK_FAST     200   // 快闪 200ms
+#define FIRMWARE_VERSION "1.0.0"
 
 // 动态生成的设备信息
 String deviceID = "";      // 基于MAC地址的设备ID
@@ -244,6 +245,7 @@ void handleApi() {
   JsonObject device = doc.createNestedObject("device");
   device["id"] = deviceID;
   device["ap_ssid"] = apSSID;
+  device["firmware"] = FIRMWARE_VERSION;
   
   // WiFi状态
   JsonObject status = doc.createNestedObject("status");
@@ -0,0 +1,400 @@
+import json
+import multiprocessing
+import socket
+import threading
+import time
+import types
+
+import pytest
+
+import manner
+from manner import (Frame, LengthPrefixedDecoder, LineDecoder, ModbusRtuDecoder,
+                    SlipDecoder, modbus_crc16)
+
+
+def with_crc(data):
+    crc = modbus_crc16(data)
+    return data + bytes([crc & 0xFF, crc >> 8])
+
+
+def feed_bytewise(decoder, data):
+    frames = []
+    for i in range(len(data)):
+        frames.extend(decoder.feed(data[i:i + 1]))
+    return [frame.payload for frame in frames]
+
+
+def test_modbus_crc16_known_value():
+    assert modbus_crc16(bytes.fromhex("010300000001")) == 0x0A84
+    # 区间计算与切片一致
+    data = b"\xff" + bytes.fromhex("010300000001") + b"\xff"
+    assert modbus_crc16(data, 1, 7) == 0x0A84
+
+
+def test_modbus_request_response_and_exception_bytewise():
+    request = with_crc(bytes.fromhex("010300000002"))
+    response = with_crc(bytes.fromhex("0103040001000A"))
+    exception = with_crc(bytes.fromhex("018302"))
+    write = with_crc(bytes.fromhex("01100001000204000A0102"))
+    payloads = feed_bytewise(ModbusRtuDecoder(), request + response + exception + write)
+    assert payloads == [request[:-2], response[:-2], exception[:-2], write[:-2]]
+
+
+def test_modbus_mask_write_and_read_write_multiple():
+    mask = with_crc(bytes.fromhex("011600040012FF00"))
+    rw_request = with_crc(bytes.fromhex("0117000300060010000304") + bytes.fromhex("00FF00FE"))
+    rw_response = with_crc(bytes.fromhex("01170C") + bytes(range(12)))
+    fifo_request = with_crc(bytes.fromhex("011804DE"))
+    fifo_response = with_crc(bytes.fromhex("011800060002") + bytes.fromhex("01B80C84"))
+    frames = [mask, mask, rw_request, rw_response, fifo_request, fifo_response]
+    payloads = feed_bytewise(ModbusRtuDecoder(), b"".join(frames))
+    assert payloads == [frame[:-2] for frame in frames]
+
+
+def test_modbus_resyncs_after_garbage():
+    decoder = ModbusRtuDecoder()
+    frame = with_crc(bytes.fromhex("010600010003"))
+    payloads = feed_bytewise(decoder, b"\x55\xaa\x00" + frame)
+    # 噪声 00 01 06 推算出11字节的响应帧，静默后才能确定其不成立
+    payloads += [f.payload for f in decoder.feed(b"", time.time() + 1)]
+    assert payloads == [frame[:-2]]
+    assert decoder.dropped == 3
+    assert len(decoder.buffer) == 0
+
+
+def test_modbus_corrupted_frame_resyncs_after_idle_gap():
+    decoder = ModbusRtuDecoder(idle_gap=0.2)
+    bad = bytearray(with_crc(bytes.fromhex("010600010003")))
+    bad[-1] ^= 0xFF
+    good = with_crc(bytes.fromhex("020600010004"))
+    # 噪声推算出的长帧尚未收齐时不输出，静默之后再按帧间隔重新解析
+    frames = list(decoder.feed(bytes(bad) + good, 1.0))
+    frames += decoder.feed(b"", 2.0)
+    assert [f.payload for f in frames] == [good[:-2]]
+    assert frames[0].timestamp == 1.0
+    assert decoder.dropped == len(bad)
+    assert len(decoder.buffer) == 0
+
+
+def test_modbus_long_frames_in_small_chunks():
+    # 长帧的前8字节恰好构成CRC正确的请求帧，不能在长帧收齐前被当成一帧
+    head = with_crc(bytes.fromhex("0103FA123456"))
+    long_frame = with_crc(head + bytes(range(245)))
+    frames = [long_frame, with_crc(bytes.fromhex("0103FA") + bytes(range(5, 255))), long_frame]
+    data = b"".join(frames)
+    decoder = ModbusRtuDecoder()
+    payloads = []
+    pos = 0
+    while pos < len(data):
+        size = 1 + pos % 13
+        payloads.extend(f.payload for f in decoder.feed(data[pos:pos + size], pos * 1e-4))
+        pos += size
+    assert payloads == [frame[:-2] for frame in frames]
+    assert decoder.dropped == 0
+
+
+def test_line_decoder_chunk_boundaries():
+    decoder = LineDecoder()
+    payloads = []
+    for chunk in [b"ab", b"c\r", b"\nde", b"f\n", b"g"]:
+        payloads.extend(frame.payload for frame in decoder.feed(memoryview(chunk)))
+    assert payloads == [b"abc", b"def"]
+    assert decoder.buffer == b"g"
+
+
+def test_line_decoder_multibyte_delimiter_split():
+    decoder = LineDecoder(delimiter=b"\r\n")
+    assert feed_bytewise(decoder, b"ab\r\ncd\r\n") == [b"ab", b"cd"]
+
+
+def test_line_decoder_overlong_line_is_flushed():
+    decoder = LineDecoder(max_length=8)
+    assert [f.payload for f in decoder.feed(b"0123456789")] == [b"0123456789"]
+    assert len(decoder.buffer) == 0
+
+
+def test_slip_decoder_unescapes_across_chunks():
+    decoder = SlipDecoder()
+    payloads = []
+    for chunk in [b"\xc0ab\xdb", b"\xdc\xdb\xdd\xc0", b"\xc0x\xc0"]:
+        payloads.extend(frame.payload for frame in decoder.feed(chunk))
+    assert payloads == [b"ab\xc0\xdb", b"x"]
+
+
+def test_length_prefixed_decoder_bytewise_and_resync():
+    decoder = LengthPrefixedDecoder(max_length=16)
+    data = b"\x00\x03abc" + b"\xff\xff" + b"\x00\x01z"
+    assert feed_bytewise(decoder, data) == [b"abc", b"z"]
+    assert decoder.dropped == 2
+
+
+def test_length_prefixed_little_endian_including_header():
+    decoder = LengthPrefixedDecoder(header_size=2, byteorder="little", length_includes_header=True)
+    assert [f.payload for f in decoder.feed(b"\x05\x00abc")] == [b"abc"]
+
+
+def test_pipeline_dispatches_to_sinks():
+    received = []
+    pipeline = manner.DecoderPipeline("dev", LineDecoder(), [lambda device_id, frame: received.append(device_id)])
+    assert pipeline.feed(b"x\ny\n") == 2
+    assert received == ["dev", "dev"]
+    assert pipeline.frame_count == 2
+
+
+def test_describe_modbus_frame():
+    frame = Frame("modbus", 0, bytes.fromhex("010304000100"))
+    assert manner.describe_frame(frame) == "从站 1 功能码 03 数据 04 00 01 00"
+
+
+def test_config_store_resets_malformed_profiles(tmp_path):
+    path = tmp_path / "config.json"
+    errors = []
+    for content in ['{"profiles": null}', '{"profiles": {"serial": [], "wifi": {"a": 1, "b": {}}}}', '[1, 2]']:
+        path.write_text(content, encoding="utf-8")
+        store = manner.ConfigStore(str(path), on_error=errors.append)
+        assert isinstance(store.get_profiles("serial"), dict)
+        assert all(isinstance(values, dict) for values in store.get_profiles("wifi").values())
+    assert store.get("first_use") is True
+    assert len(errors) == 4
+
+
+def test_config_store_resets_invalid_shard_workers(tmp_path):
+    path = tmp_path / "config.json"
+    for content in ['{"shard_workers": "4x"}', '{"shard_workers": null}', '{"shard_workers": -1}',
+                    '{"shard_workers": true}', '{"shard_workers": 2.5}']:
+        path.write_text(content, encoding="utf-8")
+        errors = []
+        store = manner.ConfigStore(str(path), on_error=errors.append)
+        assert store.get("shard_workers") == 0
+        assert len(errors) == 1
+    path.write_text('{"shard_workers": 4}', encoding="utf-8")
+    assert manner.ConfigStore(str(path)).get("shard_workers") == 4
+
+
+def test_config_store_debounced_atomic_save(tmp_path):
+    path = tmp_path / "config.json"
+    store = manner.ConfigStore(str(path), delay=60)
+    store.set("first_use", False)
+    store.save_profile("serial", "fast", {"baudrate": "115200", "parity": "N"})
+    assert not path.exists()
+    assert store.flush()
+    reloaded = manner.ConfigStore(str(path))
+    assert reloaded.get("first_use") is False
+    assert reloaded.get_profiles("serial") == {"fast": {"baudrate": "115200", "parity": "N"}}
+    assert [p.name for p in tmp_path.iterdir()] == ["config.json"]
+
+
+class FakeResponse:
+    status_code = 200
+
+    def __init__(self, data):
+        self.data = data
+
+    def json(self):
+        return self.data
+
+
+def test_probe_prefers_reachable_address():
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen()
+    try:
+        cache = manner.ReachabilityCache(port=server.getsockname()[1], timeout=1.0)
+        assert cache.probe(["127.0.0.2", "127.0.0.1"]) == "127.0.0.1"
+        assert cache.probe(["127.0.0.2"]) is None
+    finally:
+        server.close()
+
+
+def test_resolve_rejects_address_of_another_device(monkeypatch):
+    cache = manner.ReachabilityCache()
+    answers = {"192.168.4.1": "device-a", "10.0.0.5": "device-b"}
+    monkeypatch.setattr(cache, "probe", lambda addresses: addresses[0])
+    monkeypatch.setattr(manner.requests, "get", lambda url, timeout: FakeResponse(
+        {"device": {"id": answers[url.split("//")[1].split(":")[0]]}}))
+
+    assert cache.resolve("device-b", ["192.168.4.1", "10.0.0.5"]) == "10.0.0.5"
+    assert cache.cached("device-b") == "10.0.0.5"
+    assert cache.resolve("device-c", ["192.168.4.1"]) is None
+    assert cache.cached("device-c") is None
+
+
+def test_request_device_retries_only_connect_failures(monkeypatch):
+    cache = manner.ReachabilityCache()
+    monkeypatch.setattr(cache, "resolve", lambda device_id, addresses: "10.0.0.5")
+    calls = []
+
+    def fail_with(error):
+        def request(method, url, **kwargs):
+            calls.append(url)
+            if len(calls) == 1:
+                raise error
+            return "ok"
+        return request
+
+    refused = manner.requests.ConnectionError(
+        types.SimpleNamespace(reason=manner.NewConnectionError(None, "refused")))
+    monkeypatch.setattr(manner.requests, "request", fail_with(refused))
+    assert manner.request_device(cache, "d", {}, "POST", "/api/reset") == "ok"
+    assert len(calls) == 2
+
+    del calls[:]
+    monkeypatch.setattr(manner.requests, "request", fail_with(manner.requests.ConnectionError("reset by peer")))
+    with pytest.raises(manner.requests.ConnectionError):
+        manner.request_device(cache, "d", {}, "POST", "/api/reset")
+    assert len(calls) == 1
+
+
+def test_with_device_ip_probes_off_ui_thread():
+    resolved = threading.Event()
+    scheduled = []
+    probe_threads = []
+
+    class Reachability:
+        def cached(self, device_id):
+            return None
+
+        def resolve(self, device_id, addresses):
+            probe_threads.append(threading.current_thread())
+            resolved.set()
+            return addresses[0]
+
+    manager = types.SimpleNamespace(
+        selected_device="dev", devices={"dev": {"ap_ip": "192.168.4.1"}}, reachability=Reachability(),
+        root=types.SimpleNamespace(after=lambda delay, callback: scheduled.append(callback)),
+        log=lambda message: None)
+    actions = []
+    manner.ESP8266Manager.with_device_ip(manager, actions.append)
+    assert resolved.wait(2)
+    assert probe_threads[0] is not threading.main_thread()
+    assert actions == []
+    deadline = time.time() + 2
+    while not scheduled and time.time() < deadline:
+        time.sleep(0.01)
+    # 结果回到UI线程后才执行操作，切换了设备则放弃
+    manager.selected_device = "other"
+    scheduled[0]()
+    assert actions == []
+    manager.selected_device = "dev"
+    scheduled[0]()
+    assert actions == ["192.168.4.1"]
+
+
+def test_benchmark_device_status_checks_identity(monkeypatch):
+    benchmark = manner.BridgeBenchmark("192.168.4.1")
+    status = {"device": {"id": "device-a", "firmware": "1.0.0"}, "serial": {"baudrate": "115200", "parity": "E"}}
+    monkeypatch.setattr(manner.requests, "get", lambda url, timeout: FakeResponse(status))
+    assert benchmark.device_status("device-a")["serial"]["parity"] == "E"
+    with pytest.raises(RuntimeError):
+        benchmark.device_status("device-b")
+
+
+class SlowSocket:
+    """每次只发送少量字节，首次发送耗时超过连续发送时长"""
+
+    def __init__(self, sock, delay):
+        self.sock = sock
+        self.delay = delay
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def send(self, data):
+        if self.delay:
+            time.sleep(self.delay)
+            self.delay = 0
+        return self.sock.send(data[:7])
+
+    def __getattr__(self, name):
+        return getattr(self.sock, name)
+
+
+def test_benchmark_finishes_half_sent_line():
+    left, right = socket.socketpair()
+
+    def echo():
+        while True:
+            data = right.recv(4096)
+            if not data:
+                break
+            right.sendall(data)
+
+    thread = threading.Thread(target=echo, daemon=True)
+    thread.start()
+    benchmark = manner.BridgeBenchmark("127.0.0.1", bulk_seconds=0.05, timeout=0.2)
+    try:
+        result = benchmark.measure_throughput(SlowSocket(left, 0.1))
+    finally:
+        left.close()
+        thread.join(1)
+        right.close()
+    assert result["bulk_sent"] >= 1
+    assert result["bulk_loss"] == 0
+    assert result["bulk_errors"] == 0
+
+
+def test_beacon_device_id_without_json_parsing():
+    assert manner.beacon_device_id(b'{"device_id":"ESP-01AB","connected":false}') == "ESP-01AB"
+    assert manner.beacon_device_id(b"not a beacon") is None
+
+
+def test_shard_worker_sends_changes_and_heartbeats():
+    conn, child = multiprocessing.Pipe()
+    worker = threading.Thread(target=manner.shard_worker, args=(child,),
+                              kwargs={"poll_interval": 3600, "flush_interval": 0.01, "heartbeat_interval": 0.2})
+    worker.start()
+    beacon = b'{"device_id":"dev","connected":false,"ap_ip":"127.0.0.1"}'
+    now = time.time()
+    try:
+        conn.send(("beacons", [(beacon, "127.0.0.1", now), (beacon, "127.0.0.1", now + 1),
+                               (b'{"device_id":"old","ap_ip":"127.0.0.1"}', "127.0.0.1", now - 3600),
+                               (b'{"device_id":"noip"}', "127.0.0.1", now)]))
+        messages = []
+        deadline = time.time() + 2
+        while time.time() < deadline and not any(m[0] == "seen" for m in messages):
+            if conn.poll(0.05):
+                messages.extend(conn.recv())
+    finally:
+        conn.send(("stop",))
+        worker.join(timeout=2)
+
+    devices = [m for m in messages if m[0] == "device"]
+    assert [m[1] for m in devices] == ["dev"]
+    assert devices[0][2]["ap_ip"] == "127.0.0.1"
+    assert [m[1] for m in messages if m[0] == "seen"] == [[("dev", now + 1)]]
+
+
+def test_shard_worker_stop_flushes_capture_export(tmp_path, monkeypatch):
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen(1)
+    port = server.getsockname()[1]
+    reader_class = manner.BridgeStreamReader
+    monkeypatch.setattr(manner, "BridgeStreamReader",
+                        lambda ip, pipeline, on_stop: reader_class(ip, pipeline, port=port, on_stop=on_stop))
+    export_path = tmp_path / "frames.jsonl"
+    conn, child = multiprocessing.Pipe()
+    worker = threading.Thread(target=manner.shard_worker, args=(child,), kwargs={"flush_interval": 0.01})
+    worker.start()
+    peer = None
+    try:
+        conn.send(("capture", "dev", "127.0.0.1", "文本行", str(export_path)))
+        peer, _ = server.accept()
+        peer.sendall(b"one\ntwo\n")
+        frames = []
+        deadline = time.time() + 2
+        while time.time() < deadline and len(frames) < 2:
+            if conn.poll(0.05):
+                frames.extend(f for m in conn.recv() if m[0] == "frames" for f in m[2])
+        assert len(frames) == 2
+    finally:
+        # 采集仍在进行时停止工作进程
+        conn.send(("stop",))
+        worker.join(timeout=5)
+        if peer:
+            peer.close()
+        server.close()
+
+    assert not worker.is_alive()
+    lines = export_path.read_text(encoding="utf-8").splitlines()
+    assert [bytes.fromhex(json.loads(line)["hex"]) for line in lines] == [b"one", b"two"]